@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import concurrent.futures
 import os
+import weakref
 from typing import Optional
 
 import numpy as np
@@ -10,39 +12,223 @@ import math
 
 import analyser_factorio_coordinate_wrapper
 
+try:
+    import utils_numba
+except ImportError:  # numba is an optional dependency - without it the numpy implementations are used
+    utils_numba = None
+
+try:
+    from scipy import spatial
+except ImportError:  # scipy is an optional dependency - without it the kd-tree prefilter is skipped
+    spatial = None
+
+try:
+    import turbojpeg
+
+    _turbojpeg_decoder = turbojpeg.TurboJPEG()
+except (ImportError, RuntimeError):  # PyTurboJPEG and its native library are optional - cv2.imread is used
+    _turbojpeg_decoder = None
+
+
+def _read_image(image_path: str) -> np.ndarray:
+    """Reads an image file as a BGR array. JPEG files take the SIMD-accelerated turbojpeg path when available,
+    which decodes 2-4x faster than the libjpeg build behind cv2.imread"""
+    if _turbojpeg_decoder is not None and os.path.splitext(image_path)[1].lower() in (".jpg", ".jpeg"):
+        with open(image_path, "rb") as file:
+            return _turbojpeg_decoder.decode(file.read(), pixel_format=turbojpeg.TJPF_BGR)
+    return cv2.imread(image_path)
+
 
 class OrePatch:
-    def __init__(self, resource_array: np.ndarray, resource_type: str, tiles_per_pixel: int):
+    def __init__(
+        self,
+        resource_array: np.ndarray,
+        resource_type: str,
+        tiles_per_pixel: int,
+        size: int = None,
+        offset: tuple[int, int] = (0, 0),
+        map_dimensions: tuple[int, int] = None,
+    ):
+        # resource_array may be just the bounding-box crop of the patch instead of a full-map array -
+        # offset gives the map position of the crop's top left corner and map_dimensions the full map size.
+        # Storing crops keeps the memory at the sum of the bounding boxes instead of patches * map size
+        # and makes the per-patch pixel operations proportional to the actual patch size.
+        # All coordinates facing the callers (contour, bounding_box, center_point, regions) stay in map pixels.
         self.resource_array = resource_array
         self.resource_type = resource_type
-        self.size = np.sum(self.resource_array)
+        self.offset_x, self.offset_y = offset
+        if map_dimensions is None:
+            map_dimensions = (resource_array.shape[0], resource_array.shape[1])
+        self.map_dimensions = map_dimensions
+        # callers may pass a precomputed size, otherwise count the mask pixels - cv2.countNonZero is a lot
+        # faster than np.sum on uint8 masks and returns a plain int, which keeps later comparisons cheap
+        self.size = cv2.countNonZero(self.resource_array) if size is None else size
         self._contour = None  # lazy initialization (costly operation that will be done just in time in the getter)
+        self._contour_x = None  # lazy initialization (costly operation that will be done just in time in the getter)
+        self._contour_y = None  # lazy initialization (costly operation that will be done just in time in the getter)
         self._center_point = None  # lazy initialization (costly operation that will be done just in time in the getter)
+        self._bounding_box = None  # lazy initialization (costly operation that will be done just in time in the getter)
+        self._distance_field = None  # lazy initialization (costly operation done just in time in the getter)
+        self._integral = None  # lazy initialization (costly operation that will be done just in time in the getter)
+        self._contour_within_region_cache: dict = {}  # region tuple -> contour points inside that region
+        self._min_distance_cache = weakref.WeakKeyDictionary()  # other patch -> distance in pixel
         self.ore_patch_coordinate_wrapper = analyser_factorio_coordinate_wrapper.OrePatchFactorioCoordinateWrapper(
             self, tiles_per_pixel
         )
 
     def display(self) -> None:  # This will open the image in your default image viewer.
         """This will open the image of the ore patch in your default image viewer. Very slow. Use for debug only"""
-        Image.fromarray(self.resource_array * 255, "L").show()
+        full_resource_array = self.resource_array_in_region(0, 0, self.map_dimensions[1], self.map_dimensions[0])
+        Image.fromarray(full_resource_array * 255, "L").show()
+
+    def resource_array_in_region(self, start_x: int, start_y: int, end_x: int, end_y: int) -> np.ndarray:
+        """Return the patch's mask for the given map region as an array of the region's size
+        Pixels outside the stored crop are zero. The region must be within the map"""
+        region_array = np.zeros((end_y - start_y, end_x - start_x), dtype=np.uint8)
+        # intersect the region with the stored crop and paste only that part
+        crop_start_x = max(start_x, self.offset_x)
+        crop_start_y = max(start_y, self.offset_y)
+        crop_end_x = min(end_x, self.offset_x + self.resource_array.shape[1])
+        crop_end_y = min(end_y, self.offset_y + self.resource_array.shape[0])
+        if crop_start_x < crop_end_x and crop_start_y < crop_end_y:
+            region_array[
+                crop_start_y - start_y : crop_end_y - start_y, crop_start_x - start_x : crop_end_x - start_x
+            ] = self.resource_array[
+                crop_start_y - self.offset_y : crop_end_y - self.offset_y,
+                crop_start_x - self.offset_x : crop_end_x - self.offset_x,
+            ]
+        return region_array
+
+    def has_resources_in_region(self, start_x: int, start_y: int, end_x: int, end_y: int) -> bool:
+        """Checks if the ore patch has any resource pixel in the given map region
+        The bounding box refutes most queries with four int comparisons, the rest is answered by
+        four lookups into the cached integral image, so no pixel data is scanned at all"""
+        min_x, min_y, max_x, max_y = self.bounding_box
+        start_x = max(start_x, min_x)
+        start_y = max(start_y, min_y)
+        end_x = min(end_x, max_x)
+        end_y = min(end_y, max_y)
+        if start_x >= end_x or start_y >= end_y:
+            return False
+        integral = self.integral  # indexed in crop coordinates, hence the offset subtraction
+        start_x -= self.offset_x
+        start_y -= self.offset_y
+        end_x -= self.offset_x
+        end_y -= self.offset_y
+        return bool(
+            integral[end_y, end_x] - integral[start_y, end_x] - integral[end_y, start_x] + integral[start_y, start_x]
+        )
 
     @property
     def contour(self):
         if self._contour is None:  # lazy initialization
             """A 2d array that contains various points that define the contour of the ore patch"""
-            contours = cv2.findContours(self.resource_array, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
-            contours_concat = np.concatenate(contours[0], axis=0)
-            self._contour = np.reshape(contours_concat, (contours_concat.shape[0], contours_concat.shape[2]))
+            if self.resource_array.shape[0] < 3 or self.resource_array.shape[1] < 3:
+                # a crop this thin has no interior pixel, so every pixel is a contour point and the
+                # cv2.findContours call overhead can be skipped for these tiny patches
+                self._contour = np.argwhere(self.resource_array)[:, ::-1]
+            else:
+                # CHAIN_APPROX_NONE is required: the distance functions take the minimum over boundary pixels,
+                # and with simplified contours (CHAIN_APPROX_SIMPLE/TC89) the closest boundary pixel usually
+                # lies in the middle of a segment, so the results would silently become too large
+                contours = cv2.findContours(self.resource_array, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+                contours_concat = np.concatenate(contours[0], axis=0)
+                self._contour = np.reshape(contours_concat, (contours_concat.shape[0], contours_concat.shape[2]))
+            if self.offset_x or self.offset_y:  # translate from crop to map coordinates
+                self._contour = self._contour + np.array([self.offset_x, self.offset_y], dtype=self._contour.dtype)
         return self._contour
 
+    @property
+    def contour_x(self) -> np.ndarray:
+        """Return the x values of all contour points as one contiguous integer array, see contour
+        The split per axis keeps the hot distance kernels on contiguous memory instead of strided columns.
+        int16 is used where the map allows it, which halves the bandwidth of the pair matrices"""
+        if self._contour_x is None:  # lazy initialization
+            self._contour_x = np.ascontiguousarray(self.contour[:, 0], dtype=self._contour_dtype())
+        return self._contour_x
+
+    @property
+    def contour_y(self) -> np.ndarray:
+        """Return the y values of all contour points as one contiguous integer array, see contour_x"""
+        if self._contour_y is None:  # lazy initialization
+            self._contour_y = np.ascontiguousarray(self.contour[:, 1], dtype=self._contour_dtype())
+        return self._contour_y
+
+    def contour_within_region(
+        self, start_x: int, start_y: int, end_x: int, end_y: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return the contour points inside the given region as per-axis arrays, see contour_x
+        Repeated queries of the same region are served from a cache, which helps analysis code that tests
+        many patch pairs against the same starting area"""
+        region = (start_x, start_y, end_x, end_y)
+        cached_contour = self._contour_within_region_cache.get(region)
+        if cached_contour is None:
+            contour_x = self.contour_x
+            contour_y = self.contour_y
+            # keep only the points inside the region - one boolean mask built from contiguous passes per axis
+            condition = (contour_x >= start_x) & (contour_x < end_x) & (contour_y >= start_y) & (contour_y < end_y)
+            cached_contour = (contour_x[condition], contour_y[condition])
+            if len(self._contour_within_region_cache) >= 4096:
+                self._contour_within_region_cache.clear()  # bound the cache, old regions are rarely revisited
+            self._contour_within_region_cache[region] = cached_contour
+        return cached_contour
+
+    def _contour_dtype(self) -> type:
+        # coordinates fit into int16 unless the map is gigantic, deltas of two coordinates still fit since
+        # the values are non-negative - only the squares have to be computed in a wider type
+        return np.int16 if max(self.map_dimensions) < 2**15 else np.int32
+
+    @property
+    def bounding_box(self) -> tuple[int, int, int, int]:
+        """Return the axis-aligned bounding box of an ore patch as (min_x, min_y, max_x, max_y) in pixel
+        max_x and max_y are exclusive, so the values can be used for slicing"""
+        if self._bounding_box is None:  # lazy initialization
+            x, y, width, height = cv2.boundingRect(self.resource_array)
+            self._bounding_box = (
+                x + self.offset_x,
+                y + self.offset_y,
+                x + width + self.offset_x,
+                y + height + self.offset_y,
+            )
+        return self._bounding_box
+
+    @property
+    def integral(self) -> np.ndarray:
+        """Return the integral image of the ore patch's mask, one row and column larger than the mask
+        The resource count of any rectangular region is then just four lookups:
+        integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+        It is indexed in crop coordinates, see has_resources_in_region for an offset-aware query"""
+        if self._integral is None:  # lazy initialization
+            self._integral = cv2.integral(self.resource_array)
+        return self._integral
+
+    @property
+    def distance_field(self) -> np.ndarray:
+        """Return an array holding for every pixel the euclidean distance to the closest pixel of the ore patch
+        Computing the field costs one pass over the full image, but afterwards the distance of any point to
+        this patch is a single lookup, which makes many-to-one distance queries cheap"""
+        if self._distance_field is None:  # lazy initialization
+            # the field has to answer lookups anywhere on the map, so embed the crop into a full-size mask
+            inverted_resource_array = np.ones(self.map_dimensions, dtype=np.uint8)
+            inverted_resource_array[
+                self.offset_y : self.offset_y + self.resource_array.shape[0],
+                self.offset_x : self.offset_x + self.resource_array.shape[1],
+            ] -= self.resource_array
+            self._distance_field = cv2.distanceTransform(
+                inverted_resource_array, cv2.DIST_L2, cv2.DIST_MASK_PRECISE
+            )
+        return self._distance_field
+
     @property
     def center_point(self):
         """Return the weighted center of an ore patch in a pixel point"""
         if self._center_point is None:  # lazy initialization
-            moments = cv2.moments(self.resource_array)
+            # for a binary mask the needed moments reduce to integer sums over the nonzero pixel indexes,
+            # which skips the full double-precision moment set cv2.moments would compute
+            ys_index, xs_index = np.nonzero(self.resource_array)
             self._center_point = (
-                (moments["m10"] / moments["m00"]),
-                (moments["m01"] / moments["m00"]),
+                xs_index.sum() / xs_index.size + self.offset_x,
+                ys_index.sum() / ys_index.size + self.offset_y,
             )
         return self._center_point
 
@@ -66,16 +252,70 @@ def _create_all_combined_ore_patches(
 ) -> dict[str, OrePatch]:
     """Filters the original image by each defined resource-colors and creates a patch from it"""
     ore_patch_combined = {}
-    all_resource_array = np.zeros((image.shape[0], image.shape[1]), dtype=np.uint8)
-    for resource_type, resource_color in resource_colors.items():
+    # pack the 3 color channels into a single int32 per pixel once, so each resource color afterwards is
+    # one equality compare over a third of the data instead of a full 3-channel cv2.inRange pass
+    packed_image = image.astype(np.int32) @ np.array([1, 1 << 8, 1 << 16], dtype=np.int32)
+    packed_colors = []
+    for resource_color in resource_colors.values():
         resource_color = resource_color[::-1]  # notice conversion from RGB to BGR with [::-1]
-        combined_resource_array = cv2.inRange(image, resource_color, resource_color) // 255
+        packed_colors.append(resource_color[0] | (resource_color[1] << 8) | (resource_color[2] << 16))
+
+    if utils_numba is not None:
+        # one fused pass over the packed image emits all per-type masks and the union at once,
+        # see utils_numba.build_resource_masks for details
+        masks = utils_numba.build_resource_masks(packed_image, np.array(packed_colors, dtype=np.int32))
+        combined_resource_arrays = [masks[index] for index in range(len(packed_colors))]
+        all_resource_array = masks[len(packed_colors)]
+    else:
+        def create_combined_resource_array(packed_color: int) -> np.ndarray:
+            return (packed_image == packed_color).astype(np.uint8)
+
+        # the resource types are independent and numpy releases the GIL in its C loops,
+        # so the masks of all resource types can be built concurrently
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(resource_colors) or 1)) as executor:
+            combined_resource_arrays = list(executor.map(create_combined_resource_array, packed_colors))
+        # one membership pass builds the "all" mask instead of accumulating the per-type masks one by one
+        all_resource_array = np.isin(packed_image, packed_colors).astype(np.uint8)
+    for resource_type, combined_resource_array in zip(resource_colors, combined_resource_arrays):
         ore_patch_combined[resource_type] = OrePatch(combined_resource_array, resource_type, tiles_per_pixel)
-        all_resource_array += combined_resource_array
     ore_patch_combined["all"] = OrePatch(all_resource_array, "all", tiles_per_pixel)
     return ore_patch_combined
 
 
+def _find_ore_patches_of_single_resource_type(
+    ore_patch_combined_of_type: OrePatch,
+    resource_type: str,
+    tiles_per_pixel: int,
+) -> list[OrePatch]:
+    """separates one combined ore patch into its individual connected ore patches"""
+    ore_patches_of_type = []
+    num_of_labels, image_of_labels, stats, centroids = cv2.connectedComponentsWithStats(
+        ore_patch_combined_of_type.resource_array, connectivity=8, ltype=cv2.CV_32S
+    )
+    for label_value in range(1, num_of_labels):  # skip label_value 0 as it is background
+        # only compare the labels within the patch's bounding box instead of scanning the full image,
+        # the size also comes for free from the stats instead of another full-image sum.
+        # Individual patches only store that bounding-box crop plus its offset, see OrePatch.__init__
+        x, y, width, height = stats[label_value, : cv2.CC_STAT_HEIGHT + 1]
+        resource_array_of_single_patch = (image_of_labels[y : y + height, x : x + width] == label_value).astype(
+            np.uint8
+        )
+        new_ore_patch = OrePatch(
+            resource_array_of_single_patch,
+            resource_type,
+            tiles_per_pixel,
+            size=int(stats[label_value, cv2.CC_STAT_AREA]),
+            offset=(int(x), int(y)),
+            map_dimensions=image_of_labels.shape,
+        )
+        new_ore_patch._bounding_box = (x, y, x + width, y + height)  # known from the stats, no need to be lazy
+        # the CCL centroids are exactly the m10/m00, m01/m00 moments, so the later cv2.moments call
+        # in the center_point getter can be skipped entirely for individual patches
+        new_ore_patch._center_point = (float(centroids[label_value][0]), float(centroids[label_value][1]))
+        ore_patches_of_type.append(new_ore_patch)
+    return ore_patches_of_type
+
+
 def _find_all_ore_patches(
     ore_patch_combined: dict[str, OrePatch],
     resource_types: list[str],
@@ -83,14 +323,21 @@ def _find_all_ore_patches(
 ) -> dict[str, list[OrePatch]]:
     """separates ore patches combined by resource type into individual ore patches"""
     ore_patches: dict[str, list[OrePatch]] = {"all": []}
-    for resource_type in resource_types:
-        ore_patches[resource_type] = []
-        num_of_labels, image_of_labels = cv2.connectedComponents(ore_patch_combined[resource_type].resource_array)
-        for label_value in range(1, num_of_labels):  # skip label_value 0 as it is background
-            resource_array_of_single_patch = (image_of_labels == label_value).astype(np.uint8)
-            new_ore_patch = OrePatch(resource_array_of_single_patch, resource_type, tiles_per_pixel)
-            ore_patches[resource_type].append(new_ore_patch)
-        ore_patches["all"].extend(ore_patches[resource_type])
+    # the resource types are independent and OpenCV releases the GIL during the labeling,
+    # so all resource types can be processed concurrently
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(8, len(resource_types) or 1)) as executor:
+        futures = {
+            resource_type: executor.submit(
+                _find_ore_patches_of_single_resource_type,
+                ore_patch_combined[resource_type],
+                resource_type,
+                tiles_per_pixel,
+            )
+            for resource_type in resource_types
+        }
+        for resource_type, future in futures.items():
+            ore_patches[resource_type] = future.result()
+            ore_patches["all"].extend(ore_patches[resource_type])
     return ore_patches
 
 
@@ -100,13 +347,16 @@ class MapAnalyser:
         image_path: str,
         resource_colors: dict[str, tuple[int, int, int]],
         tiles_per_pixel: int,
+        image: np.ndarray = None,
     ):
-        image = cv2.imread(image_path)
+        if image is None:  # an already decoded BGR array for image_path may be passed to skip the read
+            image = _read_image(image_path)
         self.map_seed = os.path.splitext(os.path.basename(image_path))[0]
         self.dimensions = (image.shape[0], image.shape[1])
         self.resource_types = list(resource_colors)
         self.ore_patch_combined = _create_all_combined_ore_patches(image, resource_colors, tiles_per_pixel)
         self.ore_patches = _find_all_ore_patches(self.ore_patch_combined, self.resource_types, tiles_per_pixel)
+        self._patch_bounding_boxes: dict[str, np.ndarray] = {}  # per resource type, lazy initialization
         self.map_analyser_coordinate_wrapper = (
             analyser_factorio_coordinate_wrapper.MapAnalyserFactorioCoordinateWrapper(self, tiles_per_pixel)
         )
@@ -128,20 +378,59 @@ class MapAnalyser:
         return self.dimensions[0]
 
     def get_ore_patches_partially_in_region(self, start_x: int, start_y: int, end_x: int, end_y: int):
-        filtered_ore_patches = dict.fromkeys(self.ore_patches)  # this includes "all"
+        # build the result dict with its empty lists in one go instead of a None-filled dict that is refilled
+        filtered_ore_patches = {resource_type: [] for resource_type in self.ore_patches}  # this includes "all"
+        # clamp the region once - the integral lookups below index the arrays directly
+        start_x = min(max(start_x, 0), self.max_x)
+        end_x = min(max(end_x, 0), self.max_x)
+        start_y = min(max(start_y, 0), self.max_y)
+        end_y = min(max(end_y, 0), self.max_y)
+        region_is_empty = start_x >= end_x or start_y >= end_y
         for resource_type, ore_patches in self.ore_patches.items():  # this includes "all"
-            filtered_ore_patches[resource_type] = []
-            if resource_type == "all":
+            if resource_type == "all" or region_is_empty:
                 continue
-            for ore_patch in ore_patches:
-                if np.sum(ore_patch.resource_array[start_y:end_y, start_x:end_x]):
+            bounding_boxes = self._patch_bounding_boxes.get(resource_type)
+            if bounding_boxes is None:  # lazy initialization
+                bounding_boxes = np.array(
+                    [ore_patch.bounding_box for ore_patch in ore_patches], dtype=np.int32
+                ).reshape(-1, 4)
+                self._patch_bounding_boxes[resource_type] = bounding_boxes
+            # one vectorized overlap pass over all bounding boxes replaces four python compares per patch,
+            # only the few surviving candidates pay the four integral lookups
+            condition = (
+                (bounding_boxes[:, 0] < end_x)
+                & (bounding_boxes[:, 2] > start_x)
+                & (bounding_boxes[:, 1] < end_y)
+                & (bounding_boxes[:, 3] > start_y)
+            )
+            for index in np.nonzero(condition)[0]:
+                ore_patch = ore_patches[index]
+                if ore_patch.has_resources_in_region(start_x, start_y, end_x, end_y):
                     filtered_ore_patches[resource_type].append(ore_patch)
                     filtered_ore_patches["all"].append(ore_patch)
         return filtered_ore_patches
 
     def count_resources_in_region(self, resource_type: str, start_x: int, start_y: int, end_x: int, end_y: int) -> int:
         """Return the amount of a given resource in the specified region in pixel"""
-        return np.sum(self.ore_patch_combined[resource_type].resource_array[start_y:end_y, start_x:end_x])
+        # count_nonzero is a specialized popcount-style scan and beats np.sum on uint8 masks
+        return np.count_nonzero(self.ore_patch_combined[resource_type].resource_array[start_y:end_y, start_x:end_x])
+
+    def count_resources_in_regions(self, resource_type: str, regions: np.ndarray) -> np.ndarray:
+        """Return the amount of a given resource in each of the specified regions in pixel
+        regions is an (N, 4) array of start_x, start_y, end_x, end_y rows, clamped to the map bounds.
+        Much faster than one count_resources_in_region call per region: the combined patch's integral
+        image answers every region with four lookups, independent of the region sizes"""
+        regions = np.asarray(regions)
+        start_x = np.clip(regions[:, 0], 0, self.max_x)
+        start_y = np.clip(regions[:, 1], 0, self.max_y)
+        end_x = np.clip(regions[:, 2], 0, self.max_x)
+        end_y = np.clip(regions[:, 3], 0, self.max_y)
+        np.maximum(end_x, start_x, out=end_x)  # empty or inverted regions count as 0
+        np.maximum(end_y, start_y, out=end_y)
+        integral = self.ore_patch_combined[resource_type].integral
+        return (
+            integral[end_y, end_x] - integral[start_y, end_x] - integral[end_y, start_x] + integral[start_y, start_x]
+        )
 
     def find_longest_consecutive_line_of_resources_in_region(
         self,
@@ -172,12 +461,18 @@ class MapAnalyser:
             # region starts with the length of the max dimension and is reduced according to the maximum sum found
             if not max_length:  # no region found that fits condition
                 return 0, None
-            kernel = np.ones((thickness, max_length), np.int8)  # convolution kernel
+            # boxFilter with normalize=False sums the same rectangle the old ones-kernel convolution did,
+            # but via running sums, so each pass costs O(W*H) regardless of the rectangle size.
+            # Border handling and saturation behave exactly like cv2.filter2D with the same anchor.
             # fmt: off
-            dst_horizontal = cv2.filter2D(resource_array, -1, kernel, anchor=(0, 0))[  # horizontal convolution
+            dst_horizontal = cv2.boxFilter(  # horizontal box sums, note ksize is (width, height)
+                resource_array, -1, (max_length, thickness), anchor=(0, 0), normalize=False
+            )[
                 0:(y_length - thickness + 1), 0:(x_length - max_length + 1)
             ]
-            dst_vertical = cv2.filter2D(resource_array, -1, kernel.transpose(), anchor=(0, 0))[  # vertical convolution
+            dst_vertical = cv2.boxFilter(  # vertical box sums
+                resource_array, -1, (thickness, max_length), anchor=(0, 0), normalize=False
+            )[
                 0:(y_length - max_length + 1), 0:(x_length - thickness + 1)
             ]
             # fmt: on
@@ -210,7 +505,59 @@ class MapAnalyser:
     @staticmethod
     def calculate_min_distance_between_patches(ore_patch: OrePatch, other_ore_patch: OrePatch) -> float:
         """Return the distance between two ore patches in pixel"""
-        return MapAnalyser._calculate_min_distance_between_contours(ore_patch.contour, other_ore_patch.contour)
+        distance = ore_patch._min_distance_cache.get(other_ore_patch)
+        if distance is None:
+            distance = MapAnalyser._calculate_min_distance_between_contours(
+                ore_patch.contour_x, ore_patch.contour_y, other_ore_patch.contour_x, other_ore_patch.contour_y
+            )
+            # store symmetrically - the weak keys make sure the cache never keeps the other patch alive
+            ore_patch._min_distance_cache[other_ore_patch] = distance
+            other_ore_patch._min_distance_cache[ore_patch] = distance
+        return distance
+
+    @staticmethod
+    def are_patches_within_distance(ore_patch: OrePatch, other_ore_patch: OrePatch, distance: float) -> bool:
+        """Checks if the free space between two ore patches is at most the given distance in pixel
+        Much faster than comparing calculate_min_distance_between_patches against a threshold when the
+        answer is no: bounding boxes and one local dilation pass refute most pairs, the exact distance is
+        only computed for the remaining candidates"""
+        distance = max(distance, 0)
+        max_delta = int(distance) + 1  # any point pair within the distance is at most this far apart per axis
+        min_x, min_y, max_x, max_y = ore_patch.bounding_box
+        other_min_x, other_min_y, other_max_x, other_max_y = other_ore_patch.bounding_box
+        # reject via the bounding boxes without touching any pixel data
+        if max(other_min_x - max_x + 1, min_x - other_max_x + 1, 0) > max_delta:
+            return False
+        if max(other_min_y - max_y + 1, min_y - other_max_y + 1, 0) > max_delta:
+            return False
+        # all point pairs that could be close enough lie in the overlap of both expanded bounding boxes,
+        # so the dilation only has to run on that window instead of the full map
+        height, width = ore_patch.map_dimensions
+        start_x = max(max(min_x, other_min_x) - max_delta, 0)
+        start_y = max(max(min_y, other_min_y) - max_delta, 0)
+        end_x = min(min(max_x, other_max_x) + max_delta, width)
+        end_y = min(min(max_y, other_max_y) + max_delta, height)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * max_delta + 1, 2 * max_delta + 1))
+        dilated = cv2.dilate(ore_patch.resource_array_in_region(start_x, start_y, end_x, end_y), kernel)
+        if not cv2.countNonZero(
+            cv2.bitwise_and(dilated, other_ore_patch.resource_array_in_region(start_x, start_y, end_x, end_y))
+        ):
+            return False  # not even within the per-axis reach, so certainly not within the distance
+        return MapAnalyser.calculate_min_distance_between_patches(ore_patch, other_ore_patch) <= distance
+
+    @staticmethod
+    def calculate_min_distances_to_patch(ore_patch: OrePatch, other_ore_patches: list[OrePatch]) -> list[float]:
+        """Return the distance between an ore patch and each of many other ore patches in pixel
+        Much faster than one calculate_min_distance_between_patches call per pair, since the distance field
+        of the common patch is computed only once and each query just samples it along the other contour.
+        The distances are approximate: diagonally adjacent patches report sqrt(2) - 1 instead of 0"""
+        distance_field = ore_patch.distance_field
+        distances = []
+        for other_ore_patch in other_ore_patches:
+            # reduce by 1 towards 0, since adjacent tiles have a distance of 0, but their centers a delta of 1
+            min_field_value = np.min(distance_field[other_ore_patch.contour_y, other_ore_patch.contour_x])
+            distances.append(max(float(min_field_value) - 1.0, 0.0))
+        return distances
 
     @staticmethod
     def calculate_min_distance_between_patches_within_region(
@@ -222,32 +569,16 @@ class MapAnalyser:
         end_y: int,
     ) -> float:
         """Return the distance between two ore patches in pixel within the specified region"""
-        if not (
-            np.amax(ore_patch.resource_array[start_y:end_y, start_x:end_x])
-            and np.amax(other_ore_patch.resource_array[start_y:end_y, start_x:end_x])
-        ):
-            return float("inf")  # fast return if any list of contour points is empty after filtering
-        contours_within_region = []
         for patch in (ore_patch, other_ore_patch):
-            # remove points in contour that are not in range, tough so read, but performant
-            contour_x = patch.contour[:, 0]  # this also creates a copy so the original values don't get overwritten
-            contour_y = patch.contour[:, 1]  # this also creates a copy so the original values don't get overwritten
-            contour_x[start_x > contour_x] = -1  # mark for removal
-            contour_x[contour_x >= end_x] = -1  # mark for removal
-            contour_y[start_y > contour_y] = -1  # mark for removal
-            contour_y[contour_y >= end_y] = -1  # mark for removal
-            # by adding 1 to the array and interpreting at as a bool, the previous -1 now becomes False, all other True
-            # if any of the x values is marked for removal we also want to remove it's y counterpart and vice versa
-            # so we use a logical and to combine the array and than duplicate it, so x and y get the same bool value
-            # fmt: off
-            condition = np.array([np.logical_and(contour_x + 1, contour_y + 1), ] * 2).transpose()
-            # fmt: on
-            contour_within_region = np.ndarray.reshape(patch.contour[condition], (-1, 2))  # filter array by condition
-            # # if not contour_within_region.size:
-            # #     return float('inf')  # fast return if any list of contour points is empty after filtering
-            contours_within_region.append(contour_within_region)
+            # fast return via the bounding boxes instead of the old full-slice np.amax scans -
+            # a patch whose box misses the region cannot contribute any contour point
+            min_x, min_y, max_x, max_y = patch.bounding_box
+            if min_x >= end_x or max_x <= start_x or min_y >= end_y or max_y <= start_y:
+                return float("inf")
+        contour_x, contour_y = ore_patch.contour_within_region(start_x, start_y, end_x, end_y)
+        other_contour_x, other_contour_y = other_ore_patch.contour_within_region(start_x, start_y, end_x, end_y)
         return MapAnalyser._calculate_min_distance_between_contours(
-            contours_within_region[0], contours_within_region[1]
+            contour_x, contour_y, other_contour_x, other_contour_y
         )
 
     @staticmethod
@@ -261,63 +592,206 @@ class MapAnalyser:
         """Merges a list of ore patches into a virtually single one, that may not even be connected"""
         combined_resource_array = np.zeros((dimensions[0], dimensions[1]), dtype=np.uint8)  # in case the list is empty
         for ore_patch in list_of_ore_patches:
-            combined_resource_array += ore_patch.resource_array
+            # only OR the pixels inside the patch's bounding box instead of adding up full-size arrays
+            min_x, min_y, max_x, max_y = ore_patch.bounding_box
+            np.maximum(
+                combined_resource_array[min_y:max_y, min_x:max_x],
+                ore_patch.resource_array_in_region(min_x, min_y, max_x, max_y),
+                out=combined_resource_array[min_y:max_y, min_x:max_x],
+            )
         return OrePatch(combined_resource_array, resource_type, tiles_per_pixel)
 
     @staticmethod
-    def _calculate_min_distance_between_contours(contour: np.ndarray, other_contour: np.ndarray) -> float:
-        """Calculates the minimum free space between two sets of points. This will be 0 for two adjacent points"""
-        # good luck trying to understand this: Using matrix operations makes this 100x faster than regular python code.
-        # We are starting with 2 arrays of vectors that contain the points of each contour.
+    def _calculate_min_distance_between_contours(
+        contour_x: np.ndarray,
+        contour_y: np.ndarray,
+        other_contour_x: np.ndarray,
+        other_contour_y: np.ndarray,
+    ) -> float:
+        """Calculates the minimum free space between two sets of points. This will be 0 for two adjacent points
+        The points are given per axis as contiguous integer arrays, see OrePatch.contour_x and contour_y
+        Return inf if either point set is empty, e.g. after region filtering"""
+        if not (contour_x.size and other_contour_x.size):
+            return float("inf")  # no point pair means no distance to measure
+        # cheap O(N+M) prefilter that removes points that can impossibly form the closest pair,
+        # so the O(N*M) pair matrix below stays small for patches that are far apart
+        contour_x, contour_y, other_contour_x, other_contour_y = MapAnalyser._prune_distant_contour_points(
+            contour_x, contour_y, other_contour_x, other_contour_y
+        )
+        if spatial is not None and contour_x.size * other_contour_x.size > 1 << 16:
+            # for large contours a kd-tree pass shrinks both point sets to the closest-approach area
+            # in O((N+M) log N) before any O(N*M) work happens
+            contour_x, contour_y, other_contour_x, other_contour_y = MapAnalyser._prune_contour_points_kdtree(
+                contour_x, contour_y, other_contour_x, other_contour_y
+            )
+        if utils_numba is not None:
+            # compiled double loop with early termination and O(1) memory, see utils_numba for details
+            return math.sqrt(
+                utils_numba.min_contour_distance_sq(contour_x, contour_y, other_contour_x, other_contour_y)
+            )
+        if min(contour_x.size, other_contour_x.size) <= 64:
+            # when one contour is tiny (common after pruning) a row-wise reduction over the other contour
+            # with O(M) memory beats building any pair matrix at all
+            if contour_x.size > other_contour_x.size:  # iterate the smaller contour
+                contour_x, contour_y, other_contour_x, other_contour_y = (
+                    other_contour_x,
+                    other_contour_y,
+                    contour_x,
+                    contour_y,
+                )
+            min_distance_sq = None
+            for point_x, point_y in zip(contour_x, contour_y):
+                diff_x = np.abs(other_contour_x - point_x)
+                np.subtract(diff_x, 1, out=diff_x)
+                np.maximum(diff_x, 0, out=diff_x)
+                diff_y = np.abs(other_contour_y - point_y)
+                np.subtract(diff_y, 1, out=diff_y)
+                np.maximum(diff_y, 0, out=diff_y)
+                distance_sq = np.multiply(diff_x, diff_x, dtype=np.int32)  # square in int32, see contour_x
+                distance_sq += np.multiply(diff_y, diff_y, dtype=np.int32)
+                point_min_distance_sq = int(np.min(distance_sq))
+                if min_distance_sq is None or point_min_distance_sq < min_distance_sq:
+                    min_distance_sq = point_min_distance_sq
+            return math.sqrt(min_distance_sq)
+        # process the pair matrix in tiles, so the temporaries stay cache-sized no matter
+        # how large the contours are, and distant tile pairs can be skipped via their bounding boxes
+        tile_size = 1024  # 1024x1024 int16 deltas are 2 MB per matrix - small enough to stay in L2/L3
+        min_distance_sq = None
+        for start in range(0, contour_x.size, tile_size):
+            tile_x = contour_x[start : start + tile_size]
+            tile_y = contour_y[start : start + tile_size]
+            for other_start in range(0, other_contour_x.size, tile_size):
+                other_tile_x = other_contour_x[other_start : other_start + tile_size]
+                other_tile_y = other_contour_y[other_start : other_start + tile_size]
+                if min_distance_sq is not None:
+                    if min_distance_sq == 0:
+                        return 0.0  # nothing can beat two adjacent points
+                    # skip the tile pair if even the gap of the tile bounding boxes cannot beat the minimum,
+                    # computed in python ints so the narrow coordinate type cannot overflow when squaring
+                    gap_x = max(
+                        int(other_tile_x.min()) - int(tile_x.max()), int(tile_x.min()) - int(other_tile_x.max())
+                    )
+                    gap_x = max(gap_x - 1, 0)
+                    gap_y = max(
+                        int(other_tile_y.min()) - int(tile_y.max()), int(tile_y.min()) - int(other_tile_y.max())
+                    )
+                    gap_y = max(gap_y - 1, 0)
+                    if gap_x * gap_x + gap_y * gap_y >= min_distance_sq:
+                        continue
+                tile_min_distance_sq = MapAnalyser._min_distance_sq_of_contour_tiles(
+                    tile_x, tile_y, other_tile_x, other_tile_y
+                )
+                if min_distance_sq is None or tile_min_distance_sq < min_distance_sq:
+                    min_distance_sq = tile_min_distance_sq
+        return math.sqrt(min_distance_sq)
+
+    @staticmethod
+    def _min_distance_sq_of_contour_tiles(
+        contour_x: np.ndarray,
+        contour_y: np.ndarray,
+        other_contour_x: np.ndarray,
+        other_contour_y: np.ndarray,
+    ) -> int:
+        """Calculates the squared minimum free space between two sets of points via the full pair matrix"""
+        # Using matrix operations makes this 100x faster than regular python code.
         # Example - expected distance is 0 since the point (5, 6) and (4, 6) are adjacent:
-        #   contour             other_contour
-        #   [[1 2]              [[7 8]
-        #    [3 4]               [4 6]
-        #    [5 6]]              [1 4]]
-        # We want to calculate the delta_x and delta_y of every point with every other point.
-        # So the first step is to separate the x and y values.
-        contour_x = contour[:, 0]
-        other_contour_x = other_contour[:, 0]
-        contour_y = contour[:, 1]
-        other_contour_y = other_contour[:, 1]
         #   contour_x           other_contour_x             contour_y           other_contour_y
         #   [1 3 5]             [7 4 1]                     [2 4 6]             [8 6 4]
-        # We copy the row and transpose just one on the resulting arrays.
-        # Now we can run operations on every x with every other x - same for y.
-        # fmt: off
-        contour_x_matrix = np.array([contour_x, ] * other_contour_x.shape[0]).transpose()
-        other_contour_x_matrix = np.array([other_contour_x, ] * contour_x.shape[0])
-        contour_y_matrix = np.array([contour_y, ] * other_contour_y.shape[0]).transpose()
-        other_contour_y_matrix = np.array([other_contour_y, ] * contour_y.shape[0])
-        # fmt: on
-        #   contour_x_matrix    other_contour_x_matrix      contour_y_matrix    other_contour_y_matrix
-        #   [[1 1 1]            [[7 4 1]                    [[2 2 2]            [[8 6 4]
-        #    [3 3 3]             [7 4 1]                    [4 4 4]              [8 6 4]
-        #    [5 5 5]]            [7 4 1]]                   [6 6 6]]             [8 6 4]]
-        # To get the x_delta of each pair we simply subtract the arrays.
-        diff_x_matrix = np.absolute(other_contour_x_matrix - contour_x_matrix)
-        diff_y_matrix = np.absolute(other_contour_y_matrix - contour_y_matrix)
+        # We want to calculate the delta_x and delta_y of every point with every other point.
+        # np.subtract.outer does this in a single fused kernel instead of materializing four full matrix
+        # copies of the coordinate rows, which would triple the memory traffic for large contours.
+        diff_x_matrix = np.abs(np.subtract.outer(contour_x, other_contour_x))
+        diff_y_matrix = np.abs(np.subtract.outer(contour_y, other_contour_y))
         #   diff_x_matrix                                   diff_y_matrix
         #   [[6 3 0]                                        [[6 4 2]
         #    [4 1 2]                                         [4 2 0]
         #    [2 1 4]]                                        [2 0 2]]
         # Adjacent tiles have a distance of 0, but a delta of 1.
         # This is why we have to reduce the delta by 1 for each dimension. Also is the reason for the abs() previously.
-        diff_x_matrix[diff_x_matrix > 0] -= 1
-        diff_y_matrix[diff_y_matrix > 0] -= 1
+        # Subtracting and clamping in-place avoids the boolean mask and any further temporary matrices.
+        np.subtract(diff_x_matrix, 1, out=diff_x_matrix)
+        np.maximum(diff_x_matrix, 0, out=diff_x_matrix)
+        np.subtract(diff_y_matrix, 1, out=diff_y_matrix)
+        np.maximum(diff_y_matrix, 0, out=diff_y_matrix)
         #   diff_x_matrix                                   diff_y_matrix
         #   [[5 2 0]                                        [[5 3 1]
         #    [3 0 1]                                         [3 1 0]
         #    [1 0 3]]                                        [1 0 1]]
         # With the deltas of each dimension we can now simply apply the euclidean norm to get the distances.
-        # sqrt(x²+y²): First square the x and y values and add them up.
-        x_matrix_sq = np.square(diff_x_matrix)
-        y_matrix_sq = np.square(diff_y_matrix)
-        distance_matrix_sq = x_matrix_sq + y_matrix_sq
+        # sqrt(x²+y²): First square the x and y values and add them up. The squares no longer fit into the
+        # narrow delta type, so they are computed into int32 explicitly.
+        distance_matrix_sq = np.multiply(diff_x_matrix, diff_x_matrix, dtype=np.int32)
+        diff_y_matrix_sq = np.multiply(diff_y_matrix, diff_y_matrix, dtype=np.int32)
+        np.add(distance_matrix_sq, diff_y_matrix_sq, out=distance_matrix_sq)
         # distance_matrix_sq min value is at 3, 2 which is the point pair (5, 6) and (4, 6) that are adjacent.
         #   x_matrix_sq         y_matrix_sq                 distance_matrix_sq
         #   [[25 4 0]            [[25 9 1]                  [[50 13  1]
         #    [ 9 0 1]      +      [ 9 1 0]         =         [18  1  1]
         #    [ 1 0 9]]            [ 1 0 1]]                  [ 2  0 10]]
-        # sqrt is a costly function, so we first find the smallest distance and only use sqrt() on the final value.
-        return math.sqrt(np.min(distance_matrix_sq))
+        # the caller takes the sqrt once on the final minimum, since sqrt is a costly function
+        return int(np.min(distance_matrix_sq))
+
+    @staticmethod
+    def _prune_distant_contour_points(
+        contour_x: np.ndarray,
+        contour_y: np.ndarray,
+        other_contour_x: np.ndarray,
+        other_contour_y: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Removes contour points that can impossibly be part of the closest point pair.
+        A point can never be closer to the other contour than to the other contour's bounding box, so every
+        point whose distance to that box exceeds the distance of one known point pair can be dropped."""
+        # distance of an arbitrary point pair as the upper bound every kept point has to be able to beat
+        diff_x = max(abs(int(contour_x[0]) - int(other_contour_x[0])) - 1, 0)
+        diff_y = max(abs(int(contour_y[0]) - int(other_contour_y[0])) - 1, 0)
+        max_distance_sq = diff_x * diff_x + diff_y * diff_y
+        for _ in range(2):  # run the same filter in both directions by swapping the contours after the 1st pass
+            # smallest possible delta of each point to the other contour's bounding box, clamped like the
+            # real distance: adjacent tiles have a delta of 1 but a distance of 0
+            diff_x = np.maximum(np.maximum(other_contour_x.min() - contour_x, contour_x - other_contour_x.max()) - 1, 0)
+            diff_y = np.maximum(np.maximum(other_contour_y.min() - contour_y, contour_y - other_contour_y.max()) - 1, 0)
+            distance_sq = np.multiply(diff_x, diff_x, dtype=np.int32)  # square in int32, see contour_x
+            distance_sq += np.multiply(diff_y, diff_y, dtype=np.int32)
+            condition = distance_sq <= max_distance_sq
+            # the point pair used for the upper bound always survives its own filter, so no contour runs empty
+            contour_x, contour_y, other_contour_x, other_contour_y = (
+                other_contour_x,
+                other_contour_y,
+                contour_x[condition],
+                contour_y[condition],
+            )
+        return contour_x, contour_y, other_contour_x, other_contour_y
+
+    @staticmethod
+    def _prune_contour_points_kdtree(
+        contour_x: np.ndarray,
+        contour_y: np.ndarray,
+        other_contour_x: np.ndarray,
+        other_contour_y: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Removes contour points that can impossibly be part of the closest point pair using kd-trees.
+        The distance of a point pair is at most sqrt(2) below its euclidean distance, so once one
+        nearest-neighbour pass establishes an upper bound, every point whose euclidean nearest neighbour
+        is further away than that bound plus sqrt(2) can be dropped - the result stays exact."""
+        points = np.stack((contour_x, contour_y), axis=1)
+        other_points = np.stack((other_contour_x, other_contour_y), axis=1)
+        tree = spatial.cKDTree(points)
+        other_tree = spatial.cKDTree(other_points)
+        distances, indexes = other_tree.query(points, k=1)
+        # real distance of each point to its euclidean nearest neighbour, its minimum is the upper bound
+        diff_x = np.maximum(np.abs(other_contour_x[indexes] - contour_x) - 1, 0)
+        diff_y = np.maximum(np.abs(other_contour_y[indexes] - contour_y) - 1, 0)
+        distance_sq = np.multiply(diff_x, diff_x, dtype=np.int32)  # square in int32, see contour_x
+        distance_sq += np.multiply(diff_y, diff_y, dtype=np.int32)
+        # the epsilon keeps pairs that sit exactly on the bound from being rounded away - keeping a few
+        # points too many is harmless, dropping the true minimum is not
+        max_distance = math.sqrt(np.min(distance_sq)) + math.sqrt(2) + 1e-6
+        other_distances = tree.query(other_points, k=1)[0]
+        condition = distances <= max_distance
+        other_condition = other_distances <= max_distance
+        return (
+            contour_x[condition],
+            contour_y[condition],
+            other_contour_x[other_condition],
+            other_contour_y[other_condition],
+        )
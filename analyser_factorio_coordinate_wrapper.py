@@ -1,20 +1,47 @@
 from __future__ import annotations
 
-import math
+import operator
 from typing import Optional
 
+import numpy as np
+
 import analyser
 
+# C-level getter for bulk-wrapping patch lists - faster than attribute access inside a comprehension
+_get_ore_patch_coordinate_wrapper = operator.attrgetter("ore_patch_coordinate_wrapper")
+
 
 class OrePatchFactorioCoordinateWrapper:
+    # one wrapper exists per patch, so with thousands of patches dropping the per-instance __dict__
+    # noticeably shrinks memory and speeds up the attribute loads in the comparison operators
+    __slots__ = (
+        "wrapped_ore_patch",
+        "_tiles_per_pixel",
+        "_tiles_per_pixel_sq",
+        "_tiles_per_pixel_float",
+        "_size",
+        "_min_x_px",
+        "_min_y_px",
+        "_center_point",
+    )
+
     def __init__(self, ore_patch: analyser.OrePatch, tiles_per_pixel: int):
         self.wrapped_ore_patch = ore_patch
         self._tiles_per_pixel = tiles_per_pixel
+        self._tiles_per_pixel_sq = tiles_per_pixel * tiles_per_pixel  # precomputed like on the map wrapper
+        self._tiles_per_pixel_float = float(tiles_per_pixel)  # for float conversions without int promotion
+        # the map origin in pixel coordinates never changes, precomputed for the center_point conversion
+        self._min_x_px = -ore_patch.map_dimensions[1] // 2
+        self._min_y_px = -ore_patch.map_dimensions[0] // 2
+        self._center_point = None  # lazy initialization (converted once on first access in the getter)
+        # the patch size never changes, so the converted size is computed once - sorting many patches then
+        # compares plain ints instead of redoing the attribute hops and multiplications per comparison
+        self._size = ore_patch.size * self._tiles_per_pixel_sq
 
     @property
     def size(self) -> int:
         """Return the size of an ore patch in Factorio tiles"""
-        return self.wrapped_ore_patch.size * self._tiles_per_pixel * self._tiles_per_pixel
+        return self._size
 
     @property
     def resource_type(self) -> str:  #
@@ -24,45 +51,72 @@ class OrePatchFactorioCoordinateWrapper:
     @property
     def center_point(self) -> tuple[float, float]:
         """Return the weighted center of an ore patch in Factorio coordinates"""
-        # get weighted center in pixel coordinates
-        x_px, y_px = self.wrapped_ore_patch.center_point
-        # convert pixel to Factorio coordinates
-        min_x_px = -self.wrapped_ore_patch.resource_array.shape[1] // 2
-        min_y_px = -self.wrapped_ore_patch.resource_array.shape[0] // 2
-        x = (x_px + min_x_px) * self._tiles_per_pixel
-        y = (y_px + min_y_px) * self._tiles_per_pixel
-        return x, y
+        if self._center_point is None:  # lazy initialization
+            # get weighted center in pixel coordinates
+            x_px, y_px = self.wrapped_ore_patch.center_point
+            # convert pixel to Factorio coordinates via the precomputed map origin
+            self._center_point = (
+                (x_px + self._min_x_px) * self._tiles_per_pixel_float,
+                (y_px + self._min_y_px) * self._tiles_per_pixel_float,
+            )
+        return self._center_point
 
     def display(self) -> None:  #
         """This will open the image of the ore patch in your default image viewer. Very slow. Use for debug only"""
         self.wrapped_ore_patch.display()
 
     def __lt__(self, other):
-        return self.wrapped_ore_patch.size < other.wrapped_ore_patch.size
+        return self._size < other._size
 
     def __le__(self, other):
-        return self.wrapped_ore_patch.size <= other.wrapped_ore_patch.size
+        return self._size <= other._size
 
     def __gt__(self, other):
-        return self.wrapped_ore_patch.size > other.wrapped_ore_patch.size
+        return self._size > other._size
 
     def __ge__(self, other):
-        return self.wrapped_ore_patch.size >= other.wrapped_ore_patch.size
+        return self._size >= other._size
 
 
 class MapAnalyserFactorioCoordinateWrapper:
+    __slots__ = (
+        "wrapped_map_analyser",
+        "_tiles_per_pixel",
+        "_tiles_per_pixel_sq",
+        "_min_x",
+        "_min_y",
+        "_max_x",
+        "_max_y",
+        "_tiles_per_pixel_float",
+        "_resource_types",
+        "_ore_patches",
+        "_ore_patch_combined",
+        "_shift",
+        "_coordinate_region_to_pixel_region",  # bound in __init__ to the generic or pow2 converter
+    )
+
     def __init__(self, map_analyser: analyser.MapAnalyser, tiles_per_pixel: int):
         self.wrapped_map_analyser = map_analyser
         self._tiles_per_pixel = tiles_per_pixel
         self._tiles_per_pixel_sq = tiles_per_pixel * tiles_per_pixel
+        self._tiles_per_pixel_float = float(tiles_per_pixel)  # for float conversions without int promotion
         __max_x_px = self.wrapped_map_analyser.dimensions[1]
         __max_y_px = self.wrapped_map_analyser.dimensions[0]
         self._min_x = (-__max_x_px // 2) * tiles_per_pixel
         self._min_y = (-__max_y_px // 2) * tiles_per_pixel
         self._max_x = (__max_x_px // 2) * tiles_per_pixel
         self._max_y = (__max_y_px // 2) * tiles_per_pixel
+        self._resource_types = list(map_analyser.resource_types)  # copied once instead of on every access
         self._ore_patches: Optional[dict[str, list[OrePatchFactorioCoordinateWrapper]]] = None  # lazy initialization
         self._ore_patch_combined: Optional[dict[str, OrePatchFactorioCoordinateWrapper]] = None  # lazy initialization
+        if tiles_per_pixel & (tiles_per_pixel - 1) == 0:
+            # the usual tile sizes (2, 4, 8) are powers of two, so the floor divisions of the hot region
+            # converter can run as arithmetic shifts - Python's >> rounds towards minus infinity like //
+            self._shift = tiles_per_pixel.bit_length() - 1
+            self._coordinate_region_to_pixel_region = self._coordinate_region_to_pixel_region_pow2
+        else:
+            self._shift = None
+            self._coordinate_region_to_pixel_region = self._coordinate_region_to_pixel_region_generic
 
     @property
     def min_x(self) -> int:
@@ -91,8 +145,9 @@ class MapAnalyserFactorioCoordinateWrapper:
 
     @property
     def resource_types(self) -> list[str]:
-        """Return a list of all resource types that can be analysed. Does not include 'all'"""
-        return self.wrapped_map_analyser.resource_types.copy()
+        """Return a list of all resource types that can be analysed. Does not include 'all'
+        The same list instance is returned on every access, so it must not be mutated by the caller"""
+        return self._resource_types
 
     @property
     def ore_patches(self) -> dict[str, list[OrePatchFactorioCoordinateWrapper]]:
@@ -102,14 +157,11 @@ class MapAnalyserFactorioCoordinateWrapper:
         my_map_analyser.ore_patches['all']  # return list of ALL patches regardless of resource type
         """
         if self._ore_patches is None:  # lazy initialization
-            ore_patches = self.wrapped_map_analyser.ore_patches
             # replace ore_patches with their ore_patch_coordinate_wrapper
-            ore_patches_with_wrapper_dict = dict.fromkeys(ore_patches)
-            for resource_type in ore_patches_with_wrapper_dict:
-                ore_patches_with_wrapper_dict[resource_type] = [
-                    elem.ore_patch_coordinate_wrapper for elem in ore_patches[resource_type]
-                ]
-            self._ore_patches = ore_patches_with_wrapper_dict
+            self._ore_patches = {
+                resource_type: list(map(_get_ore_patch_coordinate_wrapper, ore_patches))
+                for resource_type, ore_patches in self.wrapped_map_analyser.ore_patches.items()
+            }
         return self._ore_patches
 
     @property
@@ -119,27 +171,26 @@ class MapAnalyserFactorioCoordinateWrapper:
         my_map_analyser.ore_patch_combined['coal']  # return all coal in only one patch as if it was a single one
         """
         if self._ore_patch_combined is None:  # lazy initialization
-            ore_patch_combined = self.wrapped_map_analyser.ore_patch_combined
             # replace ore_patches with their ore_patch_coordinate_wrapper
-            ore_patch_combined_with_wrapper_dict = dict.fromkeys(ore_patch_combined)
-            for resource_type in ore_patch_combined_with_wrapper_dict:
-                ore_patch_combined_with_wrapper_dict[resource_type] = ore_patch_combined[
-                    resource_type
-                ].ore_patch_coordinate_wrapper
-            self._ore_patch_combined = ore_patch_combined_with_wrapper_dict
+            self._ore_patch_combined = {
+                resource_type: ore_patch.ore_patch_coordinate_wrapper
+                for resource_type, ore_patch in self.wrapped_map_analyser.ore_patch_combined.items()
+            }
         return self._ore_patch_combined
 
     def is_in_bounds_x(self, x: int) -> bool:
         """Checks if the x value of a Factorio coordinate is withing the bounds of the image"""
-        return self.min_x <= x <= self.max_x
+        return self._min_x <= x <= self._max_x
 
     def is_in_bounds_y(self, y: int) -> bool:
         """Checks if the y value of a Factorio coordinate is withing the bounds of the image"""
-        return self.min_y <= y <= self.max_y
+        return self._min_y <= y <= self._max_y
 
     def is_in_bounds_point(self, point: tuple[int, int]) -> bool:
         """Checks if a Factorio coordinate is withing the bounds of the image"""
-        return self.is_in_bounds_x(point[0]) and self.is_in_bounds_y(point[1])
+        # inlined instead of calling is_in_bounds_x/is_in_bounds_y, which would cost two extra frames
+        x, y = point
+        return self._min_x <= x <= self._max_x and self._min_y <= y <= self._max_y
 
     def count_resources_in_region(self, resource_type: str, start_x: int, start_y: int, end_x: int, end_y: int) -> int:
         """Return the amount of a given resource in the specified region in Factorio tiles"""
@@ -153,6 +204,16 @@ class MapAnalyserFactorioCoordinateWrapper:
         )
         return self._tiles_per_pixel_sq * area_px
 
+    def count_resources_in_regions(self, resource_type: str, regions: np.ndarray) -> np.ndarray:
+        """Return the amount of a given resource in each of the specified regions in Factorio tiles
+        regions is an (N, 4) array of start_x, start_y, end_x, end_y rows in Factorio coordinates.
+        Much faster than one count_resources_in_region call per region for grid sweeps, since the
+        coordinate conversion and the counting both run vectorized over all regions at once"""
+        regions_px = self._coordinate_regions_to_pixel_regions(regions)
+        # call parent and convert areas in square pixels to Factorio tiles in one stroke
+        areas_px = self.wrapped_map_analyser.count_resources_in_regions(resource_type, regions_px)
+        return areas_px * self._tiles_per_pixel_sq
+
     def get_ore_patches_partially_in_region(
         self,
         start_x: int,
@@ -169,12 +230,10 @@ class MapAnalyserFactorioCoordinateWrapper:
             start_x_px, start_y_px, end_x_px, end_y_px
         )
         # replace ore_patches with their ore_patch_coordinate_wrapper
-        ore_patches_with_wrapper_dict = dict.fromkeys(ore_patches)
-        for resource_type in ore_patches_with_wrapper_dict:
-            ore_patches_with_wrapper_dict[resource_type] = [
-                elem.ore_patch_coordinate_wrapper for elem in ore_patches[resource_type]
-            ]
-        return ore_patches_with_wrapper_dict
+        return {
+            resource_type: list(map(_get_ore_patch_coordinate_wrapper, ore_patches_of_type))
+            for resource_type, ore_patches_of_type in ore_patches.items()
+        }
 
     def find_longest_consecutive_line_of_resources_in_region(
         self,
@@ -205,8 +264,10 @@ class MapAnalyserFactorioCoordinateWrapper:
         # call parent with conversions to pixel
         max_length, region = self.wrapped_map_analyser.find_longest_consecutive_line_of_resources_in_region(
             resource_type,
-            math.ceil(thickness / self._tiles_per_pixel),
-            math.ceil(tolerance / self._tiles_per_pixel_sq),
+            # integer ceiling divisions via the same negative rounding trick as in _coordinate_to_pixel,
+            # which avoids the float round-trip of math.ceil(x / y)
+            -(-thickness // self._tiles_per_pixel),
+            -(-tolerance // self._tiles_per_pixel_sq),
             start_x_px,
             start_y_px,
             end_x_px,
@@ -217,7 +278,7 @@ class MapAnalyserFactorioCoordinateWrapper:
             return 0, None
         return (
             max_length * self._tiles_per_pixel,
-            self._pixel_region_to_coordinate_region(region[0], region[1], region[2], region[3]),
+            self._pixel_region_to_coordinate_region(*region),  # unpack once instead of four subscripts
         )
 
     def calculate_min_distance_between_patches(
@@ -229,8 +290,35 @@ class MapAnalyserFactorioCoordinateWrapper:
             analyser.MapAnalyser.calculate_min_distance_between_patches(
                 ore_patch.wrapped_ore_patch, other_ore_patch.wrapped_ore_patch
             )
-            * self._tiles_per_pixel
+            * self._tiles_per_pixel_float
+        )
+
+    def are_patches_within_distance(
+        self,
+        ore_patch: OrePatchFactorioCoordinateWrapper,
+        other_ore_patch: OrePatchFactorioCoordinateWrapper,
+        distance: float,
+    ) -> bool:
+        """Checks if the free space between two ore patches is at most the given distance in Factorio tiles
+        Much faster than comparing calculate_min_distance_between_patches against a threshold"""
+        # call parent with the distance converted from Factorio tiles to pixel
+        return analyser.MapAnalyser.are_patches_within_distance(
+            ore_patch.wrapped_ore_patch, other_ore_patch.wrapped_ore_patch, distance / self._tiles_per_pixel_float
+        )
+
+    def calculate_min_distances_to_patch(
+        self,
+        ore_patch: OrePatchFactorioCoordinateWrapper,
+        other_ore_patches: list[OrePatchFactorioCoordinateWrapper],
+    ) -> list[float]:
+        """Return the distance between an ore patch and each of many other ore patches in Factorio tiles
+        Much faster than one calculate_min_distance_between_patches call per pair, but the distances are
+        approximate: diagonally adjacent patches report a small positive distance instead of 0"""
+        # call parent and convert distances in pixels to Factorio tiles
+        distances = analyser.MapAnalyser.calculate_min_distances_to_patch(
+            ore_patch.wrapped_ore_patch, [elem.wrapped_ore_patch for elem in other_ore_patches]
         )
+        return [distance * self._tiles_per_pixel_float for distance in distances]
 
     def calculate_min_distance_between_patches_within_region(
         self,
@@ -258,28 +346,33 @@ class MapAnalyserFactorioCoordinateWrapper:
                 end_x_px,
                 end_y_px,
             )
-            * self._tiles_per_pixel
+            * self._tiles_per_pixel_float
         )
 
     def _coordinate_to_pixel(self, point: tuple[int, int], round_up: bool = False) -> tuple[int, int]:
         """Converts Factorio coordinates to an image point in pixel"""
+        # read the precomputed attributes directly - no property dispatch in these hot converters
         if round_up:
             point = (  # This takes advantage of negative int rounding: 3 // 2 = 1, but -(-3 // 2) = 2
-                -((-point[0] + self.min_x) // self._tiles_per_pixel),
-                -((-point[1] + self.min_y) // self._tiles_per_pixel),
+                -((-point[0] + self._min_x) // self._tiles_per_pixel),
+                -((-point[1] + self._min_y) // self._tiles_per_pixel),
             )
         else:  # round down
-            point = ((point[0] - self.min_x) // self._tiles_per_pixel, (point[1] - self.min_y) // self._tiles_per_pixel)
+            point = (
+                (point[0] - self._min_x) // self._tiles_per_pixel,
+                (point[1] - self._min_y) // self._tiles_per_pixel,
+            )
         return point
 
-    def _coordinate_region_to_pixel_region(
+    def _coordinate_region_to_pixel_region_generic(
         self, start_x: int, start_y: int, end_x: int, end_y: int
     ) -> tuple[int, int, int, int]:
         """Converts a region of Factorio coordinates to a region of image points in pixel
-        makes the region larger, if inputs don't align"""
-        tiles_per_pixel = self._tiles_per_pixel  # cheaper referencing
-        min_x = self.min_x  # cheaper referencing
-        min_y = self.min_y  # cheaper referencing
+        makes the region larger, if inputs don't align
+        __init__ binds this to _coordinate_region_to_pixel_region unless the pow2 variant applies"""
+        tiles_per_pixel = self._tiles_per_pixel  # cheaper referencing, no property dispatch
+        min_x = self._min_x  # cheaper referencing, no property dispatch
+        min_y = self._min_y  # cheaper referencing, no property dispatch
         return (
             # round start down
             (start_x - min_x) // tiles_per_pixel,
@@ -290,13 +383,44 @@ class MapAnalyserFactorioCoordinateWrapper:
             -((-end_y + min_y) // tiles_per_pixel),
         )
 
+    def _coordinate_region_to_pixel_region_pow2(
+        self, start_x: int, start_y: int, end_x: int, end_y: int
+    ) -> tuple[int, int, int, int]:
+        """Converts a region of Factorio coordinates to a region of image points in pixel
+        Arithmetic-shift specialization for power-of-two tiles_per_pixel, bound by __init__ - the shift
+        rounds towards minus infinity exactly like the floor divisions of the generic variant"""
+        shift = self._shift  # cheaper referencing, no property dispatch
+        min_x = self._min_x  # cheaper referencing, no property dispatch
+        min_y = self._min_y  # cheaper referencing, no property dispatch
+        return (
+            # round start down
+            (start_x - min_x) >> shift,
+            (start_y - min_y) >> shift,
+            # round end up via the same negative rounding trick as in the generic variant
+            -((-end_x + min_x) >> shift),
+            -((-end_y + min_y) >> shift),
+        )
+
+    def _coordinate_regions_to_pixel_regions(self, regions: np.ndarray) -> np.ndarray:
+        """Converts an (N, 4) array of Factorio coordinate regions to pixel regions in one pass
+        Same semantics as _coordinate_region_to_pixel_region - starts round down, ends round up, so
+        unaligned regions become larger - but as four vector operations instead of N Python calls"""
+        regions = np.asarray(regions)
+        tiles_per_pixel = self._tiles_per_pixel
+        regions_px = np.empty_like(regions)
+        regions_px[:, 0] = (regions[:, 0] - self._min_x) // tiles_per_pixel
+        regions_px[:, 1] = (regions[:, 1] - self._min_y) // tiles_per_pixel
+        regions_px[:, 2] = -((-regions[:, 2] + self._min_x) // tiles_per_pixel)
+        regions_px[:, 3] = -((-regions[:, 3] + self._min_y) // tiles_per_pixel)
+        return regions_px
+
     def _pixel_region_to_coordinate_region(
         self, start_x: int, start_y: int, end_x: int, end_y: int
     ) -> tuple[int, int, int, int]:
         """Converts a region of image points in pixel to a region of Factorio coordinates"""
-        tiles_per_pixel = self._tiles_per_pixel  # cheaper referencing
-        min_x = self.min_x  # cheaper referencing
-        min_y = self.min_y  # cheaper referencing
+        tiles_per_pixel = self._tiles_per_pixel  # cheaper referencing, no property dispatch
+        min_x = self._min_x  # cheaper referencing, no property dispatch
+        min_y = self._min_y  # cheaper referencing, no property dispatch
         return (
             start_x * tiles_per_pixel + min_x,
             start_y * tiles_per_pixel + min_y,
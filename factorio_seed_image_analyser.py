@@ -1,5 +1,9 @@
+from operator import attrgetter
 from typing import Optional
 import argparse
+
+import numpy
+
 import image_analyser_pool
 from analyser import MapAnalyser
 
@@ -46,7 +50,7 @@ def my_analyser_function(analyser_px: MapAnalyser) -> Optional[list[str]]:
 
     # example on how to get the largest iron patch and it's size, type and center point
     ore_patches = analyser.ore_patches["iron"]
-    largest_ore_patch = max(ore_patches, key=lambda patch: patch.size)
+    largest_ore_patch = max(ore_patches, key=attrgetter("size"))  # C-level getter, faster than a lambda key
     largest_ore_patch_size_in_tiles = largest_ore_patch.size
     largest_ore_patch_resource_type = largest_ore_patch.resource_type
     largest_ore_patch_center_point = largest_ore_patch.center_point
@@ -148,34 +152,49 @@ def my_analyser_function(analyser_px: MapAnalyser) -> Optional[list[str]]:
 
     copper_patch_combined = analyser.ore_patch_combined["copper"]
     coal_patch_combined = analyser.ore_patch_combined["coal"]
+    # are_patches_within_distance rejects most far-apart pairs via their bounding boxes and a local
+    # dilation pass without running the full distance kernel, which prunes the candidate pairs cheaply.
+    # Every pair is tested at most once: the close copper/coal patches of an iron patch are collected
+    # before the combination loop, and coal-copper results are memoized since the same pair reappears
+    # for different iron patches - this turns the triple loop into edge lists plus triangle enumeration
+    coal_copper_is_close: dict[tuple, bool] = {}
     for iron_patch in large_iron_ore_patches:
         # first test if any copper patch & coal patch is within max_distance of the tested iron patch otherwise skip
-        if max_distance >= analyser.calculate_min_distance_between_patches(
-            iron_patch, copper_patch_combined
-        ) and max_distance >= analyser.calculate_min_distance_between_patches(iron_patch, coal_patch_combined):
-            # just test for all combinations of this iron and all copper/ coal patches
-            for copper_patch in large_copper_ore_patches:
-                # copper close to this iron?
-                if max_distance >= analyser.calculate_min_distance_between_patches(iron_patch, copper_patch):
-                    for coal_patch in large_coal_ore_patches:
-                        # coal close to this iron?
-                        if max_distance >= analyser.calculate_min_distance_between_patches(coal_patch, iron_patch):
-                            if max_distance >= analyser.calculate_min_distance_between_patches(
-                                # coal close to copper?
-                                coal_patch,
-                                copper_patch,
-                            ):
-                                # found iron/ copper/ coal triple successfully
-                                possible_starting_areas.append((iron_patch, copper_patch, coal_patch))
+        if analyser.are_patches_within_distance(
+            iron_patch, copper_patch_combined, max_distance
+        ) and analyser.are_patches_within_distance(iron_patch, coal_patch_combined, max_distance):
+            # copper/ coal close to this iron? tested once per pair instead of inside the combination loop
+            close_copper_patches = [
+                patch
+                for patch in large_copper_ore_patches
+                if analyser.are_patches_within_distance(iron_patch, patch, max_distance)
+            ]
+            close_coal_patches = [
+                patch
+                for patch in large_coal_ore_patches
+                if analyser.are_patches_within_distance(patch, iron_patch, max_distance)
+            ]
+            for copper_patch in close_copper_patches:
+                for coal_patch in close_coal_patches:
+                    # coal close to copper? memoized across the iron patches
+                    pair = (coal_patch, copper_patch)
+                    is_close = coal_copper_is_close.get(pair)
+                    if is_close is None:
+                        is_close = analyser.are_patches_within_distance(coal_patch, copper_patch, max_distance)
+                        coal_copper_is_close[pair] = is_close
+                    if is_close:
+                        # found iron/ copper/ coal triple successfully
+                        possible_starting_areas.append((iron_patch, copper_patch, coal_patch))
     # now get the average center point of the 3 patches für printing
-    possible_starting_areas_coordinates = []
-    for area in possible_starting_areas:
-        possible_starting_areas_coordinates.append(
-            (
-                (area[0].center_point[0] + area[1].center_point[0] + area[2].center_point[0]) / 3,
-                (area[0].center_point[1] + area[1].center_point[1] + area[2].center_point[1]) / 3,
-            )
+    # averaged as one numpy reduction over a (K, 3, 2) array instead of per-axis Python additions
+    if possible_starting_areas:
+        centers = numpy.array(
+            [(area[0].center_point, area[1].center_point, area[2].center_point) for area in possible_starting_areas]
         )
+        # tolist converts the numpy scalars back to plain floats for printing
+        possible_starting_areas_coordinates = [tuple(coordinate) for coordinate in centers.mean(axis=1).tolist()]
+    else:
+        possible_starting_areas_coordinates = []
     if do_prints:
         print(f"There are nice starting areas located at {possible_starting_areas_coordinates}.")
 
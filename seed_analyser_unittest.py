@@ -2,6 +2,8 @@ from __future__ import annotations
 
 import unittest
 
+import numpy
+
 import analyser
 import analyser_factorio_coordinate_wrapper
 import image_analyser_pool
@@ -146,6 +148,14 @@ class SeedAnalyserUnittest(unittest.TestCase):
                     expected_results[i],
                 )
 
+    def test_count_resources_in_regions(self):
+        for i in range(0, 5):
+            with self.subTest(i=i):
+                expected_results = [1216, 704, 128, 0, 2112]
+                regions = numpy.array([[-96, -40, -16, 40], [-90, -33, -22, 33]])
+                results = self.analyser[i].count_resources_in_regions(self.resource_type_with_all[i], regions)
+                self.assertEqual(list(results), [expected_results[i], expected_results[i]])
+
     def test_calculate_min_distance_between_patches(self):
         for i in range(0, 5):
             with self.subTest(i=i):
@@ -165,6 +175,48 @@ class SeedAnalyserUnittest(unittest.TestCase):
                 result = self.analyser[i].calculate_min_distance_between_patches(patch1, patch2)
                 self.assertEqual(round(result, 2), expected_results[i])
 
+    def test_are_patches_within_distance(self):
+        for i in range(0, 5):
+            with self.subTest(i=i):
+                expected_distances = [304, 422.18, 617.25, 407.92, 97.32]
+                ore_patches = self.analyser[i].ore_patches[self.resource_type_with_all[i]]
+                ore_patches = sorted(ore_patches)
+                patch1 = None
+                patch2 = None
+                for elem in ore_patches:
+                    if elem.size > 500:
+                        patch1 = elem
+                        break
+                for elem in ore_patches:
+                    if elem.size > 1000:
+                        patch2 = elem
+                        break
+                self.assertFalse(
+                    self.analyser[i].are_patches_within_distance(patch1, patch2, expected_distances[i] - 8)
+                )
+                self.assertTrue(
+                    self.analyser[i].are_patches_within_distance(patch1, patch2, expected_distances[i] + 8)
+                )
+
+    def test_calculate_min_distances_to_patch(self):
+        for i in range(0, 5):
+            with self.subTest(i=i):
+                expected_results = [304.1, 424.96, 620.55, 410.61, 98.73]
+                ore_patches = self.analyser[i].ore_patches[self.resource_type_with_all[i]]
+                ore_patches = sorted(ore_patches)
+                patch1 = None
+                patch2 = None
+                for elem in ore_patches:
+                    if elem.size > 500:
+                        patch1 = elem
+                        break
+                for elem in ore_patches:
+                    if elem.size > 1000:
+                        patch2 = elem
+                        break
+                result = self.analyser[i].calculate_min_distances_to_patch(patch1, [patch2])
+                self.assertEqual([round(elem, 2) for elem in result], [expected_results[i]])
+
     def test_calculate_min_distance_between_patches_dist0(self):
         for i in range(4, 5):
             with self.subTest(i=i):
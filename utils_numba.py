@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import numba
+import numpy as np
+
+
+@numba.njit(parallel=True, cache=True)
+def build_resource_masks(packed_image: np.ndarray, packed_colors: np.ndarray) -> np.ndarray:
+    """Return the binary mask of every packed resource color plus the union of all of them
+    One fused pass over the packed image writes all masks at once instead of one full compare pass per
+    resource color plus a membership pass for the union - the scan is memory bound, so the win is roughly
+    the number of passes saved. The rows are split across all cores. The result has one mask per color in
+    the order of packed_colors, followed by the union mask as the last entry."""
+    height, width = packed_image.shape
+    num_colors = packed_colors.shape[0]
+    masks = np.zeros((num_colors + 1, height, width), dtype=np.uint8)
+    for y in numba.prange(height):
+        for x in range(width):
+            value = packed_image[y, x]
+            for index in range(num_colors):
+                if value == packed_colors[index]:
+                    masks[index, y, x] = 1
+                    masks[num_colors, y, x] = 1
+                    break  # the colors are distinct, no other mask can match this pixel
+    return masks
+
+
+@numba.njit(parallel=True, fastmath=True, cache=True)
+def min_contour_distance_sq(
+    contour_x: np.ndarray,
+    contour_y: np.ndarray,
+    other_contour_x: np.ndarray,
+    other_contour_y: np.ndarray,
+) -> np.int64:
+    """Return the squared minimum free space between two sets of points. This will be 0 for adjacent points
+    Same semantic as the matrix implementation in analyser, but as a compiled double loop: it needs no O(N*M)
+    matrix and keeps a running minimum, so the inner loop can skip the y part of pairs that are already too
+    far apart in x. The outer loop is parallelized across all cores. A CUDA variant was considered but is
+    not worth it here: contours are a few thousand points at most and the analyser already runs one process
+    per core, so the transfer and launch overhead would eat the kernel win."""
+    best = np.int64(2**62)
+    for i in numba.prange(contour_x.shape[0]):
+        point_x = np.int64(contour_x[i])
+        point_y = np.int64(contour_y[i])
+        local_best = np.int64(2**62)
+        for j in range(other_contour_x.shape[0]):
+            # adjacent tiles have a distance of 0, but a delta of 1, so reduce each delta by 1 towards 0
+            diff_x = abs(np.int64(other_contour_x[j]) - point_x) - 1
+            if diff_x < 0:
+                diff_x = 0
+            diff_x_sq = diff_x * diff_x
+            if diff_x_sq >= local_best:
+                continue  # the x delta alone can no longer beat the running minimum, skip the y part
+            diff_y = abs(np.int64(other_contour_y[j]) - point_y) - 1
+            if diff_y < 0:
+                diff_y = 0
+            distance_sq = diff_x_sq + diff_y * diff_y
+            if distance_sq < local_best:
+                local_best = distance_sq
+        best = min(best, local_best)
+    return best